@@ -79,6 +79,11 @@ class CosimHistory(BaseHistory):
            by querying the CosimHistory state buffer for a time step."""
         return self.buffer[step % self.n_time]
 
+    def query_range(self, start_step, n_steps):
+        """This method returns a copy of the whole TVB state
+           for the n_steps time steps from start_step, in a (n_steps, n_var, n_node, n_mode) array."""
+        return self.buffer[numpy.arange(start_step, start_step + n_steps) % self.n_time]
+
     @classmethod
     def from_simulator(cls, sim):
         inst = cls(sim.synchronization_n_step,
@@ -29,6 +29,7 @@
 .. moduleauthor:: Dionysios Perdikis <dionperd@gmail.com>
 """
 
+import numba
 import numpy
 
 from tvb.basic.neotraits.api import HasTraits, Attr, NArray
@@ -36,11 +37,59 @@ from tvb.simulator.coupling import Coupling, Linear
 from tvb.simulator.monitors import Raw, RawVoi, AfferentCoupling
 
 
+@numba.njit(cache=True, fastmath=True, parallel=True, nogil=True)
+def _linear_coupling_range(buffer, weights, idelays, a, b, start_step, out):
+    "Linear coupling of the history buffer, for the out.shape[0] steps from start_step, without the GIL."
+    n_time = buffer.shape[0]
+    n_step, n_cvar, n_node, n_mode = out.shape
+    for i in numba.prange(n_node):
+        for k in range(n_step):
+            step = start_step + k
+            for c in range(n_cvar):
+                for m in range(n_mode):
+                    gx = 0.0
+                    for j in range(n_node):
+                        if weights[i, j] != 0.0:
+                            gx += weights[i, j] * buffer[(step - 1 - idelays[i, j]) % n_time, c, j, m]
+                    out[k, c, i, m] = a * gx + b
+
+
+def _voi_index(voi):
+    "Index selecting voi: a slice if voi is a run of consecutive variables, a view rather than a gather."
+    voi = numpy.asarray(voi, dtype=numpy.intp)
+    if voi.ndim == 0:
+        # a single variable drops the variable axis, as state[voi] does
+        return int(voi)
+    if voi.size > 0 and (numpy.diff(voi) == 1).all():
+        return slice(int(voi[0]), int(voi[-1]) + 1)
+    return voi
+
+
 class CosimMonitor(HasTraits):
     """
     Abstract base class for cosimulation monitors implementations.
+
+    The block sampling paths spend their time in NumPy gathers and compiled kernels,
+    which release the GIL, so a co-simulator driven from another thread can run
+    while the monitors are sampled.
     """
 
+    dtype = Attr(
+        field_type=object,
+        label="Output dtype",
+        default=None,
+        required=False,
+        doc="""Floating point type of the sampled values, e.g. numpy.float32 or 'float32' to
+               halve the memory traffic of the output, or None to keep the dtype of the history.""")
+
+    _scratch = None
+
+    def configure(self, *args, **kwargs):
+        "Normalise the output dtype to a numpy.dtype."
+        super(CosimMonitor, self).configure(*args, **kwargs)
+        if self.dtype is not None:
+            self.dtype = numpy.dtype(self.dtype)
+
     def _sample_with_tvb_monitor(self, step, state):
         """
         This method provides output from TVB Monitor classes, and should be set to a TVB Monitor parent class.
@@ -48,7 +97,8 @@ class CosimMonitor(HasTraits):
         """
         raise NotImplemented
 
-    def _get_sample(self, current_step, start_step, n_steps, history, cosim):
+    def _check_available_steps(self, current_step, start_step, n_steps, history, cosim):
+        "Raise a ValueError if the history doesn't hold all steps requested."
         end_step = start_step + n_steps
         if end_step - 1 > current_step:
             raise ValueError("Values of state variables are missing for %d time steps "
@@ -65,18 +115,32 @@ class CosimMonitor(HasTraits):
                              "from start_step (=%d) to start_step + n_steps - 1 (=%d).\n"
                              "The simulator contains only the state from start_step = %d."
                              % (n_steps, start_step, end_step - 1, last_available_step_in_the_past))
-        times = []
-        values = []
-        for step in range(start_step, end_step):
-            if cosim:
-                state = history.query(step)
-            else:
-                state = history.query(step)[0]
-            tmp = self._sample_with_tvb_monitor(step, state)
-            if tmp is not None:
-                times.append(tmp[0])
-                values.append(tmp[1])
-        return [numpy.array(times), numpy.array(values)]
+
+    def _step_times(self, start_step, n_steps):
+        "Times of the n_steps steps from start_step, as sampled by Raw monitors."
+        return numpy.arange(start_step, start_step + n_steps) * numpy.float64(self.dt)
+
+    def _scratch_buffer(self, name, shape, dtype):
+        "Work array kept across sync windows, reallocated only when its shape or dtype changes."
+        if self._scratch is None:
+            self._scratch = {}
+        buf = self._scratch.get(name)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = self._scratch[name] = numpy.empty(shape, dtype=dtype)
+        return buf
+
+    def _as_output(self, values):
+        "Cast sampled values to the output dtype, if one is set."
+        if self.dtype is None:
+            return values
+        return values.astype(self.dtype, copy=False)
+
+    def _query_states(self, start_step, n_steps, history, cosim):
+        "States of all steps from start_step, gathered in one (n_steps, ...) block."
+        if cosim:
+            return history.query_range(start_step, n_steps)
+        # current states of TVB's history.query(step), without computing the delayed states
+        return history.buffer[(numpy.arange(start_step, start_step + n_steps) - 1) % history.n_time]
 
     def sample(self, current_step, start_step, n_steps, cosim_history, history):
         """
@@ -103,7 +167,8 @@ class CosimMonitorFromCoupling(CosimMonitor):
 
     synchronization_n_step = None
 
-    def _get_sample(self, current_step, start_step, n_steps, history):
+    def _check_coupling_steps(self, current_step, start_step, n_steps):
+        "Raise a ValueError if the coupling can't be computed for all steps requested."
         end_step = start_step + n_steps
         last_available_step_in_the_future = current_step + self.synchronization_n_step
         if end_step - 1 > last_available_step_in_the_future:
@@ -117,14 +182,33 @@ class CosimMonitorFromCoupling(CosimMonitor):
                              "from start_step (=%d) to start_step + n_steps -1 (=%d).\n"
                              "The coupling can be computed from current_step + 1 = %d."
                              % (n_steps, start_step, end_step - 1, first_available_step))
-        times = []
-        values = []
-        for step in range(start_step, end_step):
-            tmp = self._sample_with_tvb_monitor(step, self.coupling(step, history))
+
+    def _sample_steps(self, start_step, n_steps, states):
+        "Sample with the TVB monitor step by step, from the states of the n_steps steps from start_step."
+        # at most one sample per step: fill preallocated buffers & trim at the end
+        times = numpy.empty((n_steps,))
+        values = None
+        n_samples = 0
+        sample_with_tvb_monitor = self._sample_with_tvb_monitor
+        for step, state in zip(range(start_step, start_step + n_steps), states):
+            tmp = sample_with_tvb_monitor(step, state)
             if tmp is not None:
-                times.append(tmp[0])
-                values.append(tmp[1])
-        return [numpy.array(times), numpy.array(values)]
+                if values is None:
+                    dtype = self.dtype if self.dtype is not None else numpy.result_type(tmp[1])
+                    values = numpy.empty((n_steps,) + numpy.shape(tmp[1]), dtype=dtype)
+                times[n_samples] = tmp[0]
+                values[n_samples] = tmp[1]
+                n_samples += 1
+        if values is None:
+            return [numpy.array([]), numpy.array([])]
+        return [times[:n_samples], values[:n_samples]]
+
+    def _get_sample(self, current_step, start_step, n_steps, history):
+        self._check_coupling_steps(current_step, start_step, n_steps)
+        coupling = self.coupling
+        # the coupling is evaluated lazily, one step at a time
+        return self._sample_steps(start_step, n_steps,
+                                  (coupling(step, history) for step in range(start_step, start_step + n_steps)))
 
     def _config_time(self, simulator):
         self.synchronization_n_step = simulator.synchronization_n_step
@@ -150,7 +234,10 @@ class RawCosim(Raw, CosimMonitor):
 
     def sample(self, current_step, start_step, n_steps, cosim_history, history):
         "Return all the states of the partial (up to synchronization time) cosimulation history"
-        return self._get_sample(current_step, start_step, n_steps, cosim_history, cosim=True)
+        # Raw samples every step as is, so the states are copied out in one block
+        self._check_available_steps(current_step, start_step, n_steps, cosim_history, cosim=True)
+        times = self._step_times(start_step, n_steps)
+        return [times, self._as_output(cosim_history.query_range(start_step, n_steps))]
 
 
 class RawVoiCosim(RawVoi, CosimMonitor):
@@ -166,12 +253,22 @@ class RawVoiCosim(RawVoi, CosimMonitor):
     """
     _ui_name = "Cosimulation RawVoi recording"
 
+    _voi_idx = None
+
+    def _config_vois(self, simulator):
+        RawVoi._config_vois(self, simulator)
+        self._voi_idx = _voi_index(self.voi)
+
     def _sample_with_tvb_monitor(self, step, state):
         return RawVoi.sample(self, step, state)
 
     def sample(self, current_step, start_step, n_steps, cosim_history, history):
         "Return all the states of the partial (up to synchronization time) cosimulation history"
-        return self._get_sample(current_step, start_step, n_steps, cosim_history, cosim=True)
+        # RawVoi samples every step, so the states are copied out in one block
+        self._check_available_steps(current_step, start_step, n_steps, cosim_history, cosim=True)
+        times = self._step_times(start_step, n_steps)
+        states = self._query_states(start_step, n_steps, cosim_history, cosim=True)
+        return [times, self._as_output(states[:, self._voi_idx])]
 
 
 class RawDelayed(Raw, CosimMonitor):
@@ -193,7 +290,10 @@ class RawDelayed(Raw, CosimMonitor):
 
     def sample(self, current_step, start_step, n_steps, cosim_history, history):
         "Return all the states of the delayed (by synchronization time) TVB history"
-        return self._get_sample(current_step, start_step, n_steps, history, cosim=False)
+        # Raw samples every step as is, so the states are copied out in one block
+        self._check_available_steps(current_step, start_step, n_steps, history, cosim=False)
+        times = self._step_times(start_step, n_steps)
+        return [times, self._as_output(self._query_states(start_step, n_steps, history, cosim=False))]
 
 
 class RawVoiDelayed(RawVoi, CosimMonitor):
@@ -210,12 +310,22 @@ class RawVoiDelayed(RawVoi, CosimMonitor):
 
     _ui_name = "Cosimulation RawVoi Delayed recording"
 
+    _voi_idx = None
+
+    def _config_vois(self, simulator):
+        RawVoi._config_vois(self, simulator)
+        self._voi_idx = _voi_index(self.voi)
+
     def _sample_with_tvb_monitor(self, step, state):
         return RawVoi.sample(self, step, state)
 
     def sample(self, current_step, start_step, n_steps, cosim_history, history):
         "Return selected states of the delayed (by synchronization time) TVB history"
-        return self._get_sample(current_step, start_step, n_steps, history, cosim=False)
+        # RawVoi samples every step, so the states are copied out in one block
+        self._check_available_steps(current_step, start_step, n_steps, history, cosim=False)
+        times = self._step_times(start_step, n_steps)
+        states = self._query_states(start_step, n_steps, history, cosim=False)
+        return [times, self._as_output(states[:, self._voi_idx])]
 
 
 class CosimCoupling(AfferentCoupling, CosimMonitorFromCoupling):
@@ -230,14 +340,54 @@ class CosimCoupling(AfferentCoupling, CosimMonitorFromCoupling):
 
     _ui_name = "Cosimulation Coupling recording"
 
+    _idelays = None
+    _common_idelay = None
+
     def _config_time(self, simulator):
         " Define time variables for the monitors and the cosimonitor."
         AfferentCoupling._config_time(self,simulator)
         CosimMonitorFromCoupling._config_time(self,simulator)
+        self._config_coupling(simulator.connectivity.weights, simulator.connectivity.idelays)
+
+    def _config_coupling(self, weights, idelays):
+        "Cache integer delays, and the delay shared by all connections if there is one, for the fast sampling paths."
+        self._idelays = numpy.ascontiguousarray(idelays, dtype=numpy.int64)
+        nnz_idelays = self._idelays[weights != 0.0]
+        if nnz_idelays.size > 0 and (nnz_idelays == nnz_idelays[0]).all():
+            self._common_idelay = int(nnz_idelays[0])
+        else:
+            self._common_idelay = None
 
     def _sample_with_tvb_monitor(self, step, state):
         return AfferentCoupling.sample(self, step, state)
 
     def sample(self, current_step, start_step, n_steps, cosim_history, history):
         "Return selected values of future coupling from (up to synchronization time) cosimulation history"
+        if self._idelays is None:
+            self._config_coupling(history.weights, history.delays)
+        coupling = self.coupling
+        # read once per synchronization window, so changes to the coupling between windows apply
+        if isinstance(coupling, Linear) and coupling.a.size == 1 and coupling.b.size == 1:
+            self._check_coupling_steps(current_step, start_step, n_steps)
+            a, b = float(coupling.a[0]), float(coupling.b[0])
+            # Linear scales by float64 parameters, so the coupling is float64 unless a dtype is set
+            dtype = numpy.dtype(self.dtype if self.dtype is not None else numpy.float64)
+            if self._common_idelay is not None:
+                # a single delay: the delayed states of all steps are one block,
+                # and the weighted sums over it a single batched matmul, scaled in place
+                steps = numpy.arange(start_step, start_step + n_steps)
+                delayed = self._scratch_buffer('delayed', (n_steps,) + history.buffer.shape[1:],
+                                               history.buffer.dtype)
+                numpy.take(history.buffer, (steps - 1 - self._common_idelay) % history.n_time, axis=0, out=delayed)
+                values = numpy.matmul(history.weights, delayed[:, self.voi], dtype=dtype)
+                values *= a
+                values += b
+            else:
+                # compiled loop over all steps, rather than one coupling evaluation per step
+                values = self._scratch_buffer('coupling', (n_steps, history.n_cvar, history.n_node, history.n_mode),
+                                              dtype)
+                _linear_coupling_range(history.buffer, history.weights, self._idelays, a, b, start_step, values)
+                values = values[:, self.voi]
+            times = self._step_times(start_step, n_steps)
+            return [times, self._as_output(values)]
         return self._get_sample(current_step, start_step, n_steps, history)
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+#
+#
+#  TheVirtualBrain-Contributors Package. This package holds simulator extensions.
+#  See also http://www.thevirtualbrain.org
+#
+# (c) 2012-2022, Baycrest Centre for Geriatric Care ("Baycrest") and others
+#
+# This program is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software Foundation,
+# either version 3 of the License, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License along with this
+# program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#   CITATION:
+# When using The Virtual Brain for scientific publications, please cite it as follows:
+#
+#   Paula Sanz Leon, Stuart A. Knock, M. Marmaduke Woodman, Lia Domide,
+#   Jochen Mersmann, Anthony R. McIntosh, Viktor Jirsa (2013)
+#       The Virtual Brain: a simulator of primate brain network dynamics.
+#   Frontiers in Neuroinformatics (7:10. doi: 10.3389/fninf.2013.00010)
+
+"""
+Compare the block sampling of the cosimulation monitors with the step by step
+reference of TVB's history queries & coupling functions.
+"""
+
+import numpy as np
+
+import tvb.simulator.lab as lab
+from tvb.tests.library.base_testcase import BaseTestCase
+from tvb.contrib.cosimulation.cosim_monitors import RawCosim, RawVoiCosim, RawDelayed, \
+    RawVoiDelayed, CosimCoupling
+from tvb.contrib.cosimulation.cosimulator import CoSimulator
+
+
+class TestMonitorsReference(BaseTestCase):
+    """
+    Test the cosimulation monitors against TVB per step, with connectomes of a common or mixed delays
+    """
+
+    _n_node = 10
+    _synchronization_time = 1.0
+
+    def _cosimulator(self, tract_lengths, cosim_monitors):
+        np.random.seed(42)
+        weights = np.random.rand(self._n_node, self._n_node)
+        weights[np.random.rand(self._n_node, self._n_node) < 0.3] = 0.0
+        np.fill_diagonal(weights, 0.0)
+        connectivity = lab.connectivity.Connectivity(
+            weights=weights,
+            tract_lengths=tract_lengths,
+            region_labels=np.array(['roi_%d' % i for i in range(self._n_node)]),
+            centres=np.zeros((self._n_node, 3)),
+            speed=np.array([4.0]))
+        sim = CoSimulator(
+            voi=np.array([0]),
+            synchronization_time=self._synchronization_time,
+            cosim_monitors=cosim_monitors,
+            proxy_inds=np.array([0]),
+            model=lab.models.Generic2dOscillator(),
+            connectivity=connectivity,
+            coupling=lab.coupling.Linear(a=np.array([0.1])),
+            integrator=lab.integrators.HeunDeterministic(dt=0.1),
+            monitors=(lab.monitors.Raw(),),
+            initial_conditions=np.random.rand(100, 2, self._n_node, 1))
+        sim.configure()
+        # the first synchronization window, then one more with the history filled in
+        sim.run()
+        sim.run()
+        return sim
+
+    def _common_delay(self):
+        return np.full((self._n_node, self._n_node), 10.0)
+
+    def _mixed_delays(self):
+        np.random.seed(42)
+        return np.random.uniform(4.0, 20.0, (self._n_node, self._n_node))
+
+    def _check_reference(self, sim, outputs):
+        n_steps = sim.synchronization_n_step
+        coupling_start_step = sim.current_step + 1
+        start_step = coupling_start_step - n_steps
+        steps = range(start_step, start_step + n_steps)
+        coupling_steps = range(coupling_start_step, coupling_start_step + n_steps)
+        for monitor, (times, values) in zip(sim.cosim_monitors, outputs):
+            # the TVB monitor sampling each step's state, or coupling, on its own
+            if isinstance(monitor, (RawCosim, RawVoiCosim)):
+                samples = [monitor._sample_with_tvb_monitor(step, sim.cosim_history.query(step)) for step in steps]
+            elif isinstance(monitor, (RawDelayed, RawVoiDelayed)):
+                samples = [monitor._sample_with_tvb_monitor(step, sim.history.query(step)[0]) for step in steps]
+            else:
+                samples = [monitor._sample_with_tvb_monitor(step, monitor.coupling(step, sim.history))
+                           for step in coupling_steps]
+            expected_times = np.array([time for time, _ in samples])
+            expected = np.array([value for _, value in samples])
+            if monitor.dtype is not None:
+                expected = expected.astype(monitor.dtype)
+            assert values.dtype == expected.dtype, monitor
+            assert values.shape == expected.shape, monitor
+            np.testing.assert_allclose(times, expected_times)
+            np.testing.assert_allclose(values, expected, rtol=1e-6, atol=1e-7)
+
+    def _test_monitors(self, tract_lengths):
+        sim = self._cosimulator(tract_lengths, (
+            RawCosim(), RawVoiCosim(variables_of_interest=np.array([1])),
+            RawVoiCosim(variables_of_interest=np.array(0)), RawVoiCosim(variables_of_interest=np.array([1, 0])),
+            RawDelayed(), RawVoiDelayed(variables_of_interest=np.array([0])),
+            RawVoiDelayed(variables_of_interest=np.array(0)),
+            RawCosim(dtype=np.float32), RawDelayed(dtype='float32'),
+            CosimCoupling(coupling=lab.coupling.Linear(a=np.array([0.1]))),
+            CosimCoupling(coupling=lab.coupling.Linear(a=np.array([0.1]), b=np.array([0.5])), dtype=np.float32),
+            CosimCoupling(coupling=lab.coupling.Sigmoidal())))
+        outputs = sim.loop_cosim_monitor_output()
+        self._check_reference(sim, outputs)
+        # the next window reuses the monitors' work arrays, leaving the previous output as is
+        previous = [values.copy() for _, values in outputs]
+        sim.run()
+        self._check_reference(sim, sim.loop_cosim_monitor_output())
+        for (_, values), values_copy in zip(outputs, previous):
+            np.testing.assert_array_equal(values, values_copy)
+        # coupling changed between windows applies to the next one
+        sim.cosim_monitors[9].coupling.a = np.array([0.5])
+        sim.cosim_monitors[10].coupling = lab.coupling.Sigmoidal()
+        sim.cosim_monitors[10].coupling.configure()
+        sim.run()
+        self._check_reference(sim, sim.loop_cosim_monitor_output())
+
+    def test_common_delay(self):
+        self._test_monitors(self._common_delay())
+
+    def test_mixed_delays(self):
+        self._test_monitors(self._mixed_delays())
@@ -42,6 +42,7 @@ try:
     import pycuda.autoinit
     from pycuda.compiler import SourceModule
     import pycuda.driver as drv
+    import pycuda.gpuarray as gpuarray
     from pycuda.driver import Out, In, InOut
     pycuda_available = True
 except Exception as exc:
@@ -52,7 +53,8 @@ from .templates import MakoUtilMix
 
 class CuBackend(MakoUtilMix):
 
-    def build_func(self, template_source, content, name='kernel', print_source=False):
+    def build_func(self, template_source, content, name='kernel', print_source=False,
+            arg_types=None):
         "Build and retrieve a Python function from template."
         source = self.render_template(template_source, content)
         if print_source:
@@ -63,4 +65,18 @@ class CuBackend(MakoUtilMix):
             print(self.insert_line_numbers(source))
             raise exc
         func = module.get_function(name)
+        if arg_types is not None:
+            # use with func.prepared_call, skips per launch argument marshalling
+            func.prepare(arg_types)
         return func
+
+    def to_device(self, stream, *arrays):
+        "Stage arrays in page-locked memory and start async copies to device."
+        pinned, device = [], []
+        for array in arrays:
+            host = drv.pagelocked_empty_like(array)
+            host[:] = array
+            pinned.append(host)
+            device.append(gpuarray.to_gpu_async(host, stream=stream))
+        # pinned buffers must outlive the copies
+        return pinned, device
@@ -37,8 +37,12 @@ code.
 """
 
 import os
+import sys
+import hashlib
 import importlib
+import importlib.util
 import numpy as np
+import numba as nb
 import autopep8
 
 from .templates import MakoUtilMix
@@ -47,13 +51,23 @@ from tvb.simulator.lab import *
 
 class NbMPRBackend(MakoUtilMix):
 
+    # generated modules & Numba's compiled artifacts persist here across runs,
+    # one per distinct kernel source; the least recently written beyond
+    # cache_max_modules are evicted, so set TVB_NB_CACHE_DIR for scratch use
+    cache_dir = os.environ.get('TVB_NB_CACHE_DIR',
+            os.path.join(os.path.expanduser('~'), '.cache', 'tvb', 'nb'))
+    cache_max_modules = 64
+
     def build_py_func(self, template_source, content, name='kernel', print_source=False,
-            modname=None):
+            modname=None, cache=False, target='cpu'):
         "Build and retrieve one or more Python functions from template."
+        content = dict(content, nb_cache=cache, nb_target=target)
         source = self.render_template(template_source, content)
         source = autopep8.fix_code(source)
         if print_source:
             print(self.insert_line_numbers(source))
+        if cache:
+            return self.eval_cached_module(source, name)
         if modname is not None:
             return self.eval_module(source, name, modname)
         else:
@@ -80,6 +94,51 @@ class NbMPRBackend(MakoUtilMix):
         fns = [getattr(mod,n) for n in name.split(',')]
         return fns[0] if len(fns)==1 else fns
 
+    def eval_cached_module(self, source, name):
+        "Import source from the disk cache, so @nb.njit(cache=True) can reuse compiled code."
+        key = '\n'.join([source, nb.__version__, sys.version])
+        modname = 'tvb_nb_' + hashlib.sha256(key.encode()).hexdigest()[:16]
+        if modname not in sys.modules:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fname = os.path.join(self.cache_dir, f'{modname}.py')
+            if not os.path.exists(fname):
+                # write & rename, concurrent processes never see a partial file
+                tmpname = f'{fname}.{os.getpid()}.tmp'
+                with open(tmpname, 'w') as fd:
+                    fd.write(source)
+                os.replace(tmpname, fname)
+                self._evict_cache()
+            spec = importlib.util.spec_from_file_location(modname, fname)
+            mod = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(mod)
+            sys.modules[modname] = mod
+        mod = sys.modules[modname]
+        fns = [getattr(mod,n) for n in name.split(',')]
+        return fns[0] if len(fns)==1 else fns
+
+    def _evict_cache(self):
+        "Remove the oldest cached modules & their compiled artifacts beyond cache_max_modules."
+        modfiles = [f for f in os.listdir(self.cache_dir) if f.startswith('tvb_nb_') and f.endswith('.py')]
+        if len(modfiles) <= self.cache_max_modules:
+            return
+        modfiles.sort(key=lambda f: os.path.getmtime(os.path.join(self.cache_dir, f)))
+        pycache = os.path.join(self.cache_dir, '__pycache__')
+        artifacts = os.listdir(pycache) if os.path.isdir(pycache) else []
+        for modfile in modfiles[:-self.cache_max_modules]:
+            modname = modfile[:-len('.py')]
+            for fname in [os.path.join(self.cache_dir, modfile)] + [
+                    os.path.join(pycache, f) for f in artifacts if f.startswith(modname + '.')]:
+                try:
+                    os.remove(fname)
+                except FileNotFoundError:
+                    pass  # removed by a concurrent process
+
+    def warmup(self, sim, compatibility_mode=False, fused_noise=False):
+        "Compile the kernel for given simulator into the disk cache."
+        self.check_compatibility(sim)
+        self._run_sim_plain(sim, nstep=1, compatibility_mode=compatibility_mode, cache=True,
+                fused_noise=fused_noise)
+
     def check_compatibility(self, sim): 
         def check_choices(val, choices):
             if not isinstance(val, choices):
@@ -100,20 +159,27 @@ class NbMPRBackend(MakoUtilMix):
         # stimulus evaluated outside the backend, no restrictions
 
 
-    def run_sim(self, sim, nstep=None, simulation_length=None, chunksize=100000, compatibility_mode=False):
+    def run_sim(self, sim, nstep=None, simulation_length=None, chunksize=100000, compatibility_mode=False,
+            cache=False, fused_noise=False):
         assert nstep is not None or simulation_length is not None or sim.simulation_length is not None
 
         self.check_compatibility(sim)
+        if fused_noise:
+            sim_noise = sim.integrator.noise
+            if not isinstance(sim_noise, noise.Additive) or sim_noise.ntau > 0.0:
+                raise NotImplementedError("Fused noise requires additive white noise.")
         if nstep is None:
             if simulation_length is None:
                 simulation_length = sim.simulation_length
             nstep = int(np.ceil(simulation_length/sim.integrator.dt))
 
         if isinstance(sim.monitors[0], monitors.Raw):
-            svar_bufs = self._run_sim_plain(sim, nstep, compatibility_mode=compatibility_mode)
+            svar_bufs = self._run_sim_plain(sim, nstep, compatibility_mode=compatibility_mode, cache=cache,
+                    fused_noise=fused_noise)
             time = np.arange(svar_bufs[0].shape[1]) * sim.integrator.dt
         elif isinstance(sim.monitors[0], monitors.TemporalAverage):
-            svar_bufs = self._run_sim_tavg_chunked(sim, nstep, chunksize=chunksize, compatibility_mode=compatibility_mode)
+            svar_bufs = self._run_sim_tavg_chunked(sim, nstep, chunksize=chunksize, compatibility_mode=compatibility_mode,
+                    cache=cache, fused_noise=fused_noise)
             T = sim.monitors[0].period
             time = np.arange(svar_bufs[0].shape[1]) * T + 0.5 * T
         else:
@@ -124,20 +190,36 @@ class NbMPRBackend(MakoUtilMix):
         )
         return (time, data),   
 
-    def _run_sim_plain(self, sim, nstep=None, compatibility_mode=False):
+    def _build_integrate(self, sim, compatibility_mode, cache, fused_noise, print_source):
         template = '<%include file="nb-montbrio.py.mako"/>'
         content = dict(
                 compatibility_mode=compatibility_mode, 
+                fused_noise=fused_noise,
                 sim=sim
         ) 
-        integrate = self.build_py_func(template, content, name='integrate', print_source=True)
+        if not fused_noise:
+            return self.build_py_func(template, content, name='integrate', print_source=print_source,
+                    cache=cache)
+        integrate, seed = self.build_py_func(template, content, name='integrate,seed',
+                print_source=print_source, cache=cache)
+        seed(sim.integrator.noise.noise_seed)
+        return integrate
+
+    def _noise_bufs(self, sim, shape, fused_noise):
+        "Buffers pre-filled with scaled noise, or zeroed if the kernel draws it."
+        if fused_noise:
+            # zero-delay coupling reads the step being written, which must not be garbage
+            return np.zeros(shape)
+        return sim.integrator.noise.generate(shape=shape) * sim.integrator.noise.gfun(None)
+
+    def _run_sim_plain(self, sim, nstep=None, compatibility_mode=False, cache=False, fused_noise=False):
+        integrate = self._build_integrate(sim, compatibility_mode, cache, fused_noise, print_source=True)
 
         horizon = sim.connectivity.horizon
         buf_len = horizon + nstep
         N = sim.connectivity.number_of_regions
-        gf = sim.integrator.noise.gfun(None)
 
-        svar_bufs = [buf for buf in sim.integrator.noise.generate( shape=(sim.model.nvar,N,buf_len) ) * gf]
+        svar_bufs = [buf for buf in self._noise_bufs(sim, (sim.model.nvar,N,buf_len), fused_noise)]
         for i, svar_buf in enumerate(svar_bufs):
             svar_buf[:,:horizon] = np.roll(sim.history.buffer[:,i,:,0], -1, axis=0).T
 
@@ -165,14 +247,12 @@ class NbMPRBackend(MakoUtilMix):
         N, T = ts.shape
         return np.mean(ts.reshape(N,T//istep,istep),-1) # length of ts better be multiple of istep 
 
-    def _run_sim_tavg_chunked(self, sim, nstep, chunksize, compatibility_mode=False):
-        template = '<%include file="nb-montbrio.py.mako"/>'
-        content = dict(sim=sim, compatibility_mode=compatibility_mode) 
-        integrate = self.build_py_func(template, content, name='integrate', print_source=False)
+    def _run_sim_tavg_chunked(self, sim, nstep, chunksize, compatibility_mode=False, cache=False,
+            fused_noise=False):
+        integrate = self._build_integrate(sim, compatibility_mode, cache, fused_noise, print_source=False)
         # chunksize in number of steps 
         horizon = sim.connectivity.horizon
         N = sim.connectivity.number_of_regions
-        gf = sim.integrator.noise.gfun(None)
 
         tavg_steps=sim.monitors[0].istep
         assert tavg_steps < chunksize
@@ -183,7 +263,7 @@ class NbMPRBackend(MakoUtilMix):
         assert nstep % tavg_steps == 0
         svar_outs = [svar_out for svar_out in np.zeros((sim.model.nvar,N,nstep//tavg_steps))]
 
-        svar_bufs = [buf for buf in sim.integrator.noise.generate( shape=(sim.model.nvar,N,chunksize+horizon) ) * gf]
+        svar_bufs = [buf for buf in self._noise_bufs(sim, (sim.model.nvar,N,chunksize+horizon), fused_noise)]
         for i, svar_buf in enumerate(svar_bufs):
             svar_buf[:,:horizon] = np.roll(sim.history.buffer[:,i,:,0], -1, axis=0).T
 
@@ -223,8 +303,22 @@ class NbMPRBackend(MakoUtilMix):
                 svar_buf[:,:horizon] = svar_buf[:,-horizon:]
 
 
-            for svar_buf, svar_noise in zip(svar_bufs, sim.integrator.noise.generate( shape=(sim.model.nvar,N,chunksize) ) * gf):
+            for svar_buf, svar_noise in zip(svar_bufs, self._noise_bufs(sim, (sim.model.nvar,N,chunksize), fused_noise)):
                 svar_buf[:,horizon:] = svar_noise
 
 
         return svar_outs
+
+
+if __name__ == '__main__':
+    # pre-compile the kernels of the default MPR simulation into the disk cache
+    sim = simulator.Simulator(
+        connectivity=connectivity.Connectivity.from_file(),
+        model=models.MontbrioPazoRoxin(),
+        integrator=integrators.HeunStochastic(
+            dt=0.1,
+            noise=noise.Additive(nsig=np.r_[0.001])),
+        monitors=[monitors.Raw()]
+    ).configure()
+    for compatibility_mode in (False, True):
+        NbMPRBackend().warmup(sim, compatibility_mode=compatibility_mode)
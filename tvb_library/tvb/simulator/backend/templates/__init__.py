@@ -29,6 +29,8 @@
 #
 
 import os
+import re
+import functools
 
 from mako.template import Template
 from mako.lookup import TemplateLookup
@@ -38,15 +40,25 @@ from mako.exceptions import text_error_template
 here = os.path.dirname(os.path.abspath(__file__))
 
 
+def inline_parameters(expr, values):
+    "Partially evaluate an expression by substituting literal values for names."
+    for name, value in values.items():
+        expr = re.sub(r'\b%s\b' % (name, ), '(%r)' % (float(value), ), expr)
+    return expr
+
+
 class MakoUtilMix:
 
-    @property
-    def lookup(self):
-        lookup = TemplateLookup(directories=[here])
-        return lookup
+    # shared, so included templates are parsed & compiled only once
+    lookup = TemplateLookup(directories=[here])
+
+    @staticmethod
+    @functools.lru_cache(maxsize=128)
+    def compile_template(source):
+        return Template(source, lookup=MakoUtilMix.lookup, strict_undefined=True)
 
     def render_template(self, source, content):
-        template = Template(source, lookup=self.lookup, strict_undefined=True)
+        template = self.compile_template(source)
         try:
             source = template.render(**content)
         except Exception as exc:
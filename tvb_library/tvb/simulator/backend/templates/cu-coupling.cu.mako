@@ -30,6 +30,12 @@
 #
 */
 
+/* state of coupled nodes is staged through shared memory in tiles of
+   TILE nodes, loaded once per block rather than once per thread */
+#ifndef TILE
+#define TILE 32
+#endif
+
 __device__ void coupling(
 	unsigned int id,
 	unsigned int n_node,
@@ -43,26 +49,40 @@ __device__ void coupling(
 % endfor
 
 	float x_i, x_j, gx; // special names in cfun definitions
+	__shared__ float x_tile[${len(sim.model.cvar)}][TILE];
 
 % for cterm in sim.model.coupling_terms:
 	cX[${loop.index}*n_node + id] = 0.0f;
 % endfor
 
-	for (unsigned int j=0; j < n_node; j++)
+	for (unsigned int jt=0; jt < n_node; jt += TILE)
 	{
-		const float wij = weights[j*n_node + id];
-		if (wij == 0.0f)
-			continue;
+		const unsigned int n_tile = min(TILE, n_node - jt);
+		__syncthreads();
+		if (threadIdx.x < n_tile)
+		{
+% for cvar in sim.model.cvar:
+			x_tile[${loop.index}][threadIdx.x] = state[${cvar}*n_node + jt + threadIdx.x];
+% endfor
+		}
+		__syncthreads();
+
+		for (unsigned int k=0; k < n_tile; k++)
+		{
+			const float wij = weights[(jt + k)*n_node + id];
+			if (wij == 0.0f)
+				continue;
 
 % for cvar, cterm in zip(sim.model.cvar, sim.model.coupling_terms):
-		x_i = state[${cvar}*n_node + id];
-		x_j = state[${cvar}*n_node +  j];
-		cX[${loop.index}*n_node + id] += wij * ${sim.coupling.pre_expr};
+			x_i = state[${cvar}*n_node + id];
+			x_j = x_tile[${loop.index}][k];
+			cX[${loop.index}*n_node + id] += wij * ${sim.coupling.pre_expr};
 % endfor
+		}
 	}
 
 % for cterm in sim.model.coupling_terms:
 	gx = cX[${loop.index}*n_node + id];
 	cX[${loop.index}*n_node + id] = ${sim.coupling.post_expr};
 % endfor
-}
\ No newline at end of file
+}
@@ -48,10 +48,11 @@ __global__ void kernel(
     const unsigned int id = threadIdx.x;
     const unsigned int n_node = ${sim.connectivity.weights.shape[0]};
 
-    /* shared memory */
-    __shared__ float shared[${sim.connectivity.weights.shape[0] * (len(sim.model.state_variables) + len(sim.model.cvar))}];
+    /* shared memory, holding the state of all nodes between steps */
+    __shared__ float shared[${sim.connectivity.weights.shape[0] * (2*len(sim.model.state_variables) + len(sim.model.cvar))}];
     float *dX = &(shared[0]);
     float *cX = &(shared[n_node*${len(sim.model.state_variables)}]);
+    float *X = &(shared[n_node*${len(sim.model.state_variables) + len(sim.model.cvar)}]);
 
     /* simulator constants */
     float dt = ${sim.integrator.dt}f;
@@ -60,21 +61,32 @@ __global__ void kernel(
 
     if (threadIdx.x < n_node)
     {
+        /* this node's state is kept in registers across steps */
+% for svar in sim.model.state_variables:
+        float ${svar}_n = state[${loop.index}*n_node + id];
+        X[${loop.index}*n_node + id] = ${svar}_n;
+% endfor
+
         for (unsigned int t = 0; t < nt; t++)
         {
             __syncthreads();
-            coupling(id, n_node, cX, weights, state);
-            dfuns(id, n_node, dX, state, cX, parmat);
+            coupling(id, n_node, cX, weights, X);
+            dfuns(id, n_node, dX, X, cX, parmat);
 
             /* integrate */
 % for svar in sim.model.state_variables:
-            state[${loop.index}*n_node + id] += dt * dX[${loop.index}*n_node + id];
+            ${svar}_n += dt * dX[${loop.index}*n_node + id];
+            X[${loop.index}*n_node + id] = ${svar}_n;
 % endfor
 
             /* monitor */
 % for svar in sim.model.state_variables:
-            trace[t*2*n_node + ${loop.index}*n_node + id] = state[${loop.index}*n_node + id];
+            trace[t*2*n_node + ${loop.index}*n_node + id] = ${svar}_n;
 % endfor 
         } 
+
+% for svar in sim.model.state_variables:
+        state[${loop.index}*n_node + id] = ${svar}_n;
+% endfor
     }
 }
@@ -34,7 +34,7 @@ import numba as nb
 
 sin, cos, exp = math.sin, math.cos, math.exp
 
-@nb.jit
+@nb.njit(parallel=True, fastmath=True, error_model="numpy")
 def coupling(cX, weights, state, di):
     
     n_svar = state.shape[0]
@@ -51,7 +51,8 @@ def coupling(cX, weights, state, di):
     x_j = nb.float32(0.0)
     gx = nb.float32(0.0)
 
-    for i in range(n_node):
+    # each node's coupling is independent, only cX[:, i] is written
+    for i in nb.prange(n_node):
         for j in range(n_node):
             wij = nb.float32(weights[i, j])
             if (wij == nb.float32(0.0)):
@@ -37,19 +37,22 @@ sin, cos, exp = math.sin, math.cos, math.exp
     svars = ', '.join(sim.model.state_variables)
     cvars = ', '.join(sim.model.coupling_terms)
 %>
+<%
+    import math
+    from tvb.simulator.backend.templates import inline_parameters
+    # global parameters & pi, partially evaluated into the dfun expressions
+    constants = {par: getattr(sim.model, par)[0] for par in sim.model.global_parameter_names}
+    constants['pi'] = math.pi
+%>
 
 % for svar in sim.model.state_variables:
-${'' if debug_nojit else '@nb.njit(inline="always")'}
+${'@cuda.jit(device=True, inline=True)' if context.get('nb_target', 'cpu') == 'cuda' else '' if debug_nojit else '@nb.njit(inline="always")'}
 def dx_${svar}(${svars}, ${cvars}, parmat):
-    ## unpack global parameters
-% for par in sim.model.global_parameter_names:
-    ${par} = ${getattr(sim.model, par)[0]}
-% endfor
+    ## global parameters & pi are inlined as literals below
     ## unpack spatialized parameters
 % for par in sim.model.spatial_parameter_names:
     ${par} = parmat[${loop.index}]
 % endfor
-    pi = np.pi
     ## compute dx
-    return ${sim.model.state_variable_dfuns[svar]};
+    return ${inline_parameters(sim.model.state_variable_dfuns[svar], constants)};
 % endfor
@@ -28,9 +28,18 @@
 #
 #
 
+<%
+    # options set by NbMPRBackend.build_py_func, defaulted for other callers
+    nb_target = context.get('nb_target', 'cpu')
+    nb_cache = context.get('nb_cache', False)
+    fused_noise = context.get('fused_noise', False)
+%>
 import math
 import numpy as np
 import numba as nb
+% if nb_target == 'cuda':
+from numba import cuda
+% endif
 
 <%include file="nb-dfuns.py.mako" />
 
@@ -39,13 +48,54 @@ import numba as nb
     import numpy as np
     from tvb.simulator.integrators import IntegratorStochastic
     cvars = [sim.model.state_variables[i] for i in sim.model.cvar]
+    # with the cuda target, each block integrates one batch member and each
+    # thread one node, so buffers and parameters gain a leading batch axis
+    use_cuda = nb_target == 'cuda'
+    device_jit = '@cuda.jit(device=True, inline=True)' if use_cuda else (
+        '' if debug_nojit else '@nb.njit(inline="always")')
     stochastic = isinstance(sim.integrator, IntegratorStochastic)
+    draw_noise = stochastic and bool(fused_noise)
+    if draw_noise:
+        # additive white noise, scaled as Noise.generate(...) * gfun
+        noise_gf = np.ravel(sim.integrator.noise.gfun(None))
+        noise_scale = np.sqrt(sim.integrator.noise.dt) * np.broadcast_to(noise_gf, (sim.model.nvar,))
 
     cvar_symbols =  ','.join([f'{cvar}_c' for cvar in cvars])
+
+    # small spatial parameter sets are frozen into the kernel as constants,
+    # and the symmetric case doesn't touch parmat at all
+    spatial_parmat = sim.model.spatial_parameter_matrix
+    inline_parmat = not use_cuda and 0 < spatial_parmat.size <= 4096
+    if spatial_parmat.size == 0:
+        parmat_n = 'None'
+    elif inline_parmat:
+        parmat_n = 'parmat_const[n]'
+    else:
+        parmat_n = 'parmat[n]'
+
+    # nodes are integrated in parallel unless a coupling term reads the
+    # step being written, i.e. a zero delay outside of compatibility mode
+    conn = sim.connectivity
+    parallel = compatibility_mode or (conn.idelays[conn.weights != 0] > 0).all()
+    jit_opts = ['fastmath=True']
+    if parallel:
+        jit_opts.append('parallel=True')
+    if nb_cache:
+        jit_opts += ['cache=True', 'boundscheck=False']
+    if use_cuda and draw_noise:
+        raise NotImplementedError('cuda target requires pre-filled noise buffers.')
+    if use_cuda and not parallel:
+        raise NotImplementedError('cuda target requires compatibility mode or non-zero delays.')
+    buf_suffix = '_batch' if use_cuda else ''
 %>
 
+% if inline_parmat:
+# spatial parameters [nnodes, nparams]
+parmat_const = np.array(${spatial_parmat.T.tolist()})
+% endif
+
 # Coupling
-${'' if debug_nojit else '@nb.njit(inline="always")'}
+${device_jit}
 def cx(t, i, N, weights, ${','.join(cvars)}, idelays):
 % for par in sim.coupling.parameter_names:
     ${par} = ${getattr(sim.coupling, par)[0]}
@@ -69,7 +119,7 @@ def cx(t, i, N, weights, ${','.join(cvars)}, idelays):
 # svar bound functions
 % if sim.model.state_variable_boundaries is not None:
 % for svar, (lo, hi) in sim.model.state_variable_boundaries.items():
-${'' if debug_nojit else '@nb.njit(inline="always")'}
+${device_jit}
 def bound_${svar}(x):
 % if lo > -np.inf: # this doesn't work, fix later
     x = x if x >= ${lo} else ${lo} 
@@ -93,27 +143,47 @@ def bound_${svar}(x):
 </%def>
 
 
-@nb.njit
+% if use_cuda:
+@cuda.jit
+% else:
+@nb.njit(${', '.join(jit_opts)})
+% endif
 def integrate(
         N,       # number of regions
         dt,
         nstep,   # integration length
         i0,      # index to t0
 % for svar in sim.model.state_variables:
-        ${svar},       # ${svar} buffer with initial history and pre-filled with noise
+        ${svar}${buf_suffix},       # ${svar} buffer with initial history and pre-filled with noise
 % endfor
         weights, 
         idelays,
-        parmat,  # spatial parameters [nparams, nnodes]
+        parmat${buf_suffix},  # spatial parameters [nnodes, nparams], unused if inlined
         stimulus # stimulus [nnodes, ntimes] or None
 ):
 
+% if use_cuda:
+    n = cuda.threadIdx.x
+    b = cuda.blockIdx.x
+% for svar in sim.model.state_variables:
+    ${svar} = ${svar}_batch[b]
+% endfor
+    parmat = parmat_batch[b]
+
+% endif
     for i in range(i0, i0 + nstep):
-        for n in range(N):
+% if use_cuda:
+        if n < N:
+% else:
+        for n in ${'nb.prange' if parallel else 'range'}(N):
+% endif
             ${cvar_symbols} = cx(i-1, n, N, weights, ${','.join(cvars)}, idelays)
 
 % for svar in sim.model.state_variables:
-% if stochastic:
+% if draw_noise:
+            # additive noise drawn in the kernel
+            ${svar}_noise = ${noise_scale[loop.index]} * np.random.standard_normal()
+% elif stochastic:
             # precomputed additive noise 
             ${svar}_noise = ${svar}[n,i]
 % else:
@@ -141,7 +211,7 @@ def integrate(
                                 ${ssvar}[n,i-1], 
 % endfor
                                 ${cvar_symbols},
-                                parmat[n] 
+                                ${parmat_n}
             ) 
 % endfor
 
@@ -158,12 +228,24 @@ def integrate(
 % for svar in sim.model.state_variables:
             ${svar}_n = ${svar}[n,i-1] + dt*(d${svar}_0 + dx_${svar}(
                 ${','.join([f'{ssvar}_int' for ssvar in sim.model.state_variables])},
-                ${cvar_symbols}, parmat[n]  ))/2.0 + ${svar}_noise + ${svar}_stim
+                ${cvar_symbols}, ${parmat_n}  ))/2.0 + ${svar}_noise + ${svar}_stim
 % endfor
             ${call_bound_svars([f'{ssvar}_n' for ssvar in sim.model.state_variables])}
 
 % for svar in sim.model.state_variables:
             ${svar}[n,i] = ${svar}_n
 % endfor
+% if use_cuda:
+        # coupling of the next step reads every node of this one
+        cuda.syncthreads()
+% else:
 
     return ${','.join(svar for svar in sim.model.state_variables)}
+% endif
+
+% if draw_noise:
+${'@nb.njit(cache=True)' if nb_cache else '@nb.njit'}
+def seed(value):
+    # Numba's generator is distinct from NumPy's and seeded separately
+    np.random.seed(value)
+% endif
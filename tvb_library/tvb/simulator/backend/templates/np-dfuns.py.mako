@@ -28,23 +28,25 @@
 #
 #
 
-def dfuns(dX, state, cX, parmat):
+<%
+    import math
+    from tvb.simulator.backend.templates import inline_parameters
+    # global parameters & pi, partially evaluated into the dfun expressions
+    constants = {par: getattr(sim.model, par)[0] for par in sim.model.global_parameter_names}
+    constants['pi'] = math.pi
+%>
 
-% for par in sim.model.global_parameter_names:
-    ${par} = ${getattr(sim.model, par)[0]}
-% endfor
+def dfuns(dX, state, cX, parmat):
 
 % for par in sim.model.spatial_parameter_names:
     ${par} = parmat[${loop.index}]
 % endfor
 
-    pi = np.pi
-
     # unpack coupling terms and states as in dfuns
     ${','.join(sim.model.coupling_terms)} = cX
     ${','.join(sim.model.state_variables)} = state
 
     # compute dfuns
 % for svar in sim.model.state_variables:
-    dX[${loop.index}] = ${sim.model.state_variable_dfuns[svar]};
+    dX[${loop.index}] = ${inline_parameters(sim.model.state_variable_dfuns[svar], constants)};
 % endfor
\ No newline at end of file
@@ -51,9 +51,9 @@ def kernel(state, weights, trace, parmat
     n_cvar = ${len(sim.model.cvar)}
     nt = ${int(sim.simulation_length/sim.integrator.dt)}
 
-    # work space arrays
-    dX = np.zeros((${sim.integrator.n_dx}, n_svar, n_node))
-    cX = np.zeros((n_cvar, n_node))
+    # work space arrays, in the precision of the state
+    dX = np.zeros((${sim.integrator.n_dx}, n_svar, n_node), dtype=state.dtype)
+    cX = np.zeros((n_cvar, n_node), dtype=state.dtype)
 
     for t in range(nt):
         integrate(state, weights, parmat, dX, cX
@@ -40,7 +40,7 @@ import numpy as np
 
 from tvb.simulator.backend.cu import CuBackend, pycuda_available
 if pycuda_available:  # quickfix
-    from tvb.simulator.backend.cu import Out, In, InOut
+    from tvb.simulator.backend.cu import drv, gpuarray
 from tvb.simulator.coupling import Sigmoidal, Linear
 from tvb.simulator.models.infinite_theta import MontbrioPazoRoxin
 
@@ -54,14 +54,18 @@ class TestCUSim(BaseTestSim):
         "Test generated CUDA kernel directly from Simulator instance."
         sim, state, t, y = self._create_sim(inhom_mmpr=True)
         template = '<%include file="cu-sim-ode.cu.mako"/>'
-        kernel = CuBackend().build_func(template, dict(sim=sim, pi=np.pi))
-        dX = state.copy()
-        weights = sim.connectivity.weights.T.copy().astype('f')
+        backend = CuBackend()
+        kernel = backend.build_func(template, dict(sim=sim, pi=np.pi), arg_types='PPPP')
+        weights = sim._weights_soa
         parmat = sim.model.spatial_parameter_matrix.astype('f')
-        yh = np.empty((len(t),)+state.shape, 'f')
-        kernel(
-            In(state), In(weights), Out(yh), In(parmat),
-            grid=(1,1), block=(128,1,1))
+        yh = drv.pagelocked_empty((len(t),)+state.shape, 'f')
+        stream = drv.Stream()
+        _, (d_state, d_weights, d_parmat) = backend.to_device(stream, state, weights, parmat)
+        d_yh = gpuarray.empty(yh.shape, yh.dtype)
+        kernel.prepared_async_call((1,1), (128,1,1), stream,
+            d_state.gpudata, d_weights.gpudata, d_yh.gpudata, d_parmat.gpudata)
+        d_yh.get_async(stream, yh)
+        stream.synchronize()
         self._check_match(y, yh[:,:,0])
 
 
@@ -79,12 +83,18 @@ __global__ void kernel(float *state, float *weights, float *cX) {
 }
 '''
         content = dict(n_node=128, sim=sim)
-        kernel = CuBackend().build_func(template, content)
+        backend = CuBackend()
+        kernel = backend.build_func(template, content, arg_types='PPP')
         state = np.random.rand(2, content['n_node']).astype('f')
         weights = np.random.randn(state.shape[1], state.shape[1]).astype('f')
-        cX = np.empty_like(state)
-        kernel(In(state), In(weights), Out(cX), 
-            grid=(1,1), block=(content['n_node'],1,1))
+        cX = drv.pagelocked_empty_like(state)
+        stream = drv.Stream()
+        _, (d_state, d_weights) = backend.to_device(stream, state, weights)
+        d_cX = gpuarray.empty(cX.shape, cX.dtype)
+        kernel.prepared_async_call((1,1), (content['n_node'],1,1), stream,
+            d_state.gpudata, d_weights.gpudata, d_cX.gpudata)
+        d_cX.get_async(stream, cX)
+        stream.synchronize()
         expected = self._eval_cfun_no_delay(sim.coupling, weights, state)
         np.testing.assert_allclose(cX, expected, 1e-5, 1e-6)
 
@@ -113,13 +123,20 @@ __global__ void kernel(float *dX, float *state, float *cX, float *parmat) {
 }
 '''
         content = dict(n_node=128, sim=sim)
-        kernel = CuBackend().build_func(template, content, print_source=True)
+        backend = CuBackend()
+        kernel = backend.build_func(template, content, print_source=True, arg_types='PPPP')
         dX, state, cX = np.random.rand(3, 2, content['n_node']).astype('f')
         parmat = sim.model.spatial_parameter_matrix.astype('f')
         if parmat.size == 0:
             parmat = np.zeros((1,),'f') # dummy
-        kernel(Out(dX), In(state), In(cX), In(parmat), 
-            grid=(1,1), block=(content['n_node'],1,1))
+        dX = drv.pagelocked_empty_like(dX)
+        stream = drv.Stream()
+        _, (d_state, d_cX, d_parmat) = backend.to_device(stream, state, cX, parmat)
+        d_dX = gpuarray.empty(dX.shape, dX.dtype)
+        kernel.prepared_async_call((1,1), (content['n_node'],1,1), stream,
+            d_dX.gpudata, d_state.gpudata, d_cX.gpudata, d_parmat.gpudata)
+        d_dX.get_async(stream, dX)
+        stream.synchronize()
         expected = sim.model.dfun(state, cX)
         np.testing.assert_allclose(dX, expected, 1e-3, 1e-5)
 
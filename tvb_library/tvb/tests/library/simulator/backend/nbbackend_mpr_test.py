@@ -27,6 +27,8 @@
 #   Frontiers in Neuroinformatics (7:10. doi: 10.3389/fninf.2013.00010)
 #
 #
+import os
+import tempfile
 import numpy
 import numpy as np
 import scipy.sparse as ss
@@ -87,6 +89,39 @@ class TestNbSim(BaseTestSim):
 
         np.testing.assert_allclose(raw_d[0,:], pdq_d[0,:], rtol=1e-5)
 
+    def test_disk_cache(self):
+        sim = simulator.Simulator(
+            model=models.MontbrioPazoRoxin(),
+            connectivity=self._random_network(N=10),
+            conduction_speed=np.inf,
+            monitors=[
+                monitors.Raw()
+            ],
+            integrator=integrators.HeunStochastic(
+                dt=0.01,
+                noise=noise.Additive(
+                    nsig=np.array([0.0, 0.0]),
+                    noise_seed=42
+                )
+            )
+        ).configure()
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            backend = NbMPRBackend()
+            backend.cache_dir = cache_dir
+            backend.warmup(sim)
+            self.assertEqual(1, len([f for f in os.listdir(cache_dir) if f.endswith('.py')]))
+            self.assertTrue(os.listdir(os.path.join(cache_dir, '__pycache__')))
+            (cache_t, cache_d), = backend.run_sim(sim, nstep=10, cache=True)
+            self.assertEqual(1, len([f for f in os.listdir(cache_dir) if f.endswith('.py')]))
+            # a distinct kernel evicts the oldest one beyond the bound
+            backend.cache_max_modules = 1
+            backend.warmup(sim, compatibility_mode=True)
+            self.assertEqual(1, len([f for f in os.listdir(cache_dir) if f.endswith('.py')]))
+
+        (pdq_t, pdq_d), = NbMPRBackend().run_sim(sim, nstep=10)
+        np.testing.assert_allclose(cache_d, pdq_d)
+
     def test_local_deterministic_spatial(self):
         dt = 0.01
         G = 0.
@@ -185,6 +220,81 @@ class TestNbSim(BaseTestSim):
                 rtol=1e-2
         )
 
+    def test_local_stochastic_fused(self):
+        def make_sim(nsig):
+            return simulator.Simulator(
+                model=models.MontbrioPazoRoxin(),
+                coupling=coupling.Linear(a=np.array([0.])),
+                connectivity=self._random_network(N=1000),
+                conduction_speed=np.inf,
+                monitors=[
+                    monitors.Raw()
+                ],
+                integrator=integrators.HeunStochastic(
+                    dt=0.01,
+                    noise=noise.Additive(
+                        nsig=nsig,
+                        noise_seed=42
+                    )
+                )
+            ).configure()
+
+        np.random.seed(42)
+        nsig = np.array([0.01, 0.02])
+        sim = make_sim(nsig)
+        sim_det = make_sim(np.array([0.0, 0.0]))
+        sim_det.history.buffer[:] = sim.history.buffer  # same initial conditions
+
+        (_, det_d), = NbMPRBackend().run_sim(sim_det, nstep=1)
+        (_, pdq_d), = NbMPRBackend().run_sim(sim, nstep=1)
+        (_, fus_d), = NbMPRBackend().run_sim(sim, nstep=1, fused_noise=True)
+
+        # after a single step, deviation from deterministic is ~ the noise
+        for i in range(2):
+            pdq_dev = pdq_d[0,i] - det_d[0,i]
+            fus_dev = fus_d[0,i] - det_d[0,i]
+            np.testing.assert_allclose(np.mean(fus_dev), 0.0, atol=3e-3)
+            np.testing.assert_allclose(np.std(fus_dev), np.std(pdq_dev), rtol=1e-1)
+
+    def test_fused_noise_zero_delay(self):
+        "Fused and pre-filled noise paths agree when coupling reads the step being written."
+        def make_sim(monitor):
+            return simulator.Simulator(
+                model=models.MontbrioPazoRoxin(),
+                coupling=coupling.Linear(a=np.array([0.5])),
+                connectivity=self._random_network(N=50),
+                conduction_speed=np.inf,
+                monitors=[monitor],
+                integrator=integrators.HeunStochastic(
+                    dt=0.01,
+                    noise=noise.Additive(nsig=np.array([0.0, 0.0]), noise_seed=42)
+                )
+            ).configure()
+
+        np.random.seed(42)
+        sim = make_sim(monitors.Raw())
+        (_, pdq_d), = NbMPRBackend().run_sim(sim, nstep=200)
+        (_, fus_d), = NbMPRBackend().run_sim(sim, nstep=200, fused_noise=True)
+        np.testing.assert_allclose(fus_d, pdq_d)
+
+        sim = make_sim(monitors.TemporalAverage(period=0.1))
+        (_, pdq_d), = NbMPRBackend().run_sim(sim, nstep=200, chunksize=50)
+        (_, fus_d), = NbMPRBackend().run_sim(sim, nstep=200, chunksize=50, fused_noise=True)
+        np.testing.assert_allclose(fus_d, pdq_d)
+
+    def test_fused_noise_notimpl(self):
+        sim = simulator.Simulator(
+            model=models.MontbrioPazoRoxin(),
+            connectivity=self._random_network(N=10),
+            monitors=[monitors.Raw()],
+            integrator=integrators.HeunStochastic(
+                dt=0.01,
+                noise=noise.Multiplicative(nsig=np.array([0.01]))
+            )
+        ).configure()
+        with self.assertRaises(NotImplementedError):
+            NbMPRBackend().run_sim(sim, nstep=1, fused_noise=True)
+
     def test_network_deterministic_nodelay(self):
         dt = 0.01
         G = 0.8
@@ -40,7 +40,6 @@ import numpy as np
 
 from tvb.simulator.coupling import Sigmoidal, Linear
 from tvb.simulator.noise import Additive, Multiplicative
-from tvb.datatypes.connectivity import Connectivity
 from tvb.simulator.models.infinite_theta import MontbrioPazoRoxin
 from tvb.simulator.integrators import (EulerDeterministic, EulerStochastic,
     HeunDeterministic, HeunStochastic, IntegratorStochastic, 
@@ -49,7 +48,7 @@ from tvb.simulator.integrators import (EulerDeterministic, EulerStochastic,
 from tvb.simulator.backend.nb import NbBackend
 
 from .backendtestbase import (BaseTestCoupling, BaseTestDfun,
-    BaseTestIntegrate, BaseTestSim)
+    BaseTestIntegrate, BaseTestSim, default_connectivity)
 
 
 class TestNbCoupling(BaseTestCoupling):
@@ -130,14 +129,15 @@ class TestNbDfun(BaseTestDfun):
     cvars = ', '.join(sim.model.coupling_terms)
 %>
 <%include file="nb-dfuns.py.mako"/>
-def kernel(dx, state, cx, parmat):
-    for i in range(state.shape[1]):
-        ${svars} = state[:, i]
+def kernel(dx, ${svars}, cx, parmat):
+    for i in range(dx.shape[1]):
 % for cvar in sim.model.coupling_terms:
-        ${cvar} = cx[${loop.index}, i]
+        ${cvar}_i = cx[${loop.index}, i]
 % endfor
 % for svar in sim.model.state_variables:
-        dx[${loop.index},i] = dx_${svar}(${svars}, ${cvars},
+        dx[${loop.index},i] = dx_${svar}(
+            ${', '.join(f'{v}[i]' for v in sim.model.state_variables)},
+            ${', '.join(f'{c}_i' for c in sim.model.coupling_terms)},
             parmat[:,i] if parmat.size else None)
 % endfor
 '''
@@ -147,7 +147,8 @@ def kernel(dx, state, cx, parmat):
         dX = np.zeros_like(cX)
         state = np.random.rand(2, 128)
         parmat = sim.model.spatial_parameter_matrix
-        kernel(dX, state, cX, parmat)
+        # one contiguous buffer per state variable
+        kernel(dX, *[np.ascontiguousarray(svar) for svar in state], cX, parmat)
         drh, dVh = dX
         dr, dV = sim.model.dfun(state, cX)
         np.testing.assert_allclose(drh, dr)
@@ -174,7 +175,7 @@ class TestNbIntegrate(BaseTestIntegrate):
     def _eval_cg(self, integrator_, state, weights_):
         class sim:
             integrator = integrator_
-            connectivity = Connectivity.from_file()
+            connectivity = default_connectivity()
             model = MontbrioPazoRoxin()
         sim.connectivity.speed = np.r_[np.inf]
         sim.connectivity.configure()
@@ -28,17 +28,21 @@
 #
 #
 
+import functools
+import tempfile
 import numpy as np
+import pytest
+from numba import cuda
 
 from tvb.simulator import simulator, models, integrators, monitors, noise
-from tvb.datatypes import connectivity
 from tvb.simulator.backend.nb_mpr import NbMPRBackend
 from tvb.simulator.backend.nb import NbBackend
+from .backendtestbase import default_connectivity
 
 
 def make_sim(sim_len=1000.0):
     sim = simulator.Simulator(
-        connectivity=connectivity.Connectivity.from_file(),
+        connectivity=default_connectivity(),
         model=models.MontbrioPazoRoxin(),
         integrator=integrators.HeunStochastic(
             dt=0.1,
@@ -49,6 +53,61 @@ def make_sim(sim_len=1000.0):
     return sim
 
 
+# kernels only depend on the (default) model, coupling & integrator, not on
+# the simulation length, so they are built once per module and shared by
+# the benchmarks below; each is called once on a short sim after building,
+# so the benchmarks time only the run & not the JIT compilation. the pdq
+# kernel is also cached on disk by Numba, in a scratch directory removed at
+# exit rather than the user's cache.
+
+_nb_cache = tempfile.TemporaryDirectory(prefix='tvb_nb_')
+
+
+def _nb_mpr_backend():
+    backend = NbMPRBackend()
+    backend.cache_dir = _nb_cache.name
+    return backend
+
+@functools.lru_cache()
+def _get_mako_kernel():
+    sim = make_sim(10.0)
+    template = '<%include file="nb-sim.py.mako"/>'
+    content = dict(sim=sim, np=np, debug_nojit=False)
+    kernel = NbBackend().build_py_func(template, content, print_source=True, name='run_sim')
+    kernel(sim)  # warmup
+    return kernel
+
+
+@functools.lru_cache()
+def _get_pdq_kernel():
+    sim = make_sim(10.0)
+    template = '<%include file="nb-montbrio.py.mako"/>'
+    content = dict(
+            compatibility_mode=False, 
+            sim=sim
+    ) 
+    integrate = _nb_mpr_backend().build_py_func(template, content, name='integrate', print_source=True,
+            cache=True)
+    run_sim_pdq(sim, integrate)  # warmup
+    return integrate
+
+
+@functools.lru_cache()
+def _get_pdq_cuda_kernel():
+    sim = make_sim(10.0)
+    template = '<%include file="nb-montbrio.py.mako"/>'
+    # the default connectivity has zero delays, so nodes can only be
+    # integrated concurrently in compatibility mode
+    content = dict(
+            compatibility_mode=True,
+            sim=sim
+    )
+    integrate = NbMPRBackend().build_py_func(template, content, name='integrate', print_source=True,
+            target='cuda')
+    run_sim_pdq_cuda(sim, integrate)  # warmup
+    return integrate
+
+
 def test_tvb_10ms(benchmark):
     sim = make_sim(10.0)
     benchmark(lambda : sim.run())
@@ -59,26 +118,42 @@ def test_tvb_100ms(benchmark):
     benchmark(lambda : sim.run())
 
 
+def make_sim_jit(sim_len=1000.0):
+    "Simulator with a drop-in for sim.run() going through the compiled NbMPR kernel."
+    sim = make_sim(sim_len)
+    integrate = _get_pdq_kernel()
+    def run():
+        r, V = run_sim_pdq(sim, integrate)
+        time = (np.arange(r.shape[1]) + 1) * sim.integrator.dt
+        data = np.stack((r.T, V.T), axis=1)[..., np.newaxis]
+        return (time, data),
+    return sim, run
+
+
+def test_tvb_jit_10ms(benchmark):
+    sim, run = make_sim_jit(10.0)
+    benchmark(run)
+
+
+def test_tvb_jit_100ms(benchmark):
+    sim, run = make_sim_jit(100.0)
+    benchmark(run)
+
+
 def test_nb_mako_10ms(benchmark):
     sim = make_sim(10.0)
-    template = '<%include file="nb-sim.py.mako"/>'
-    content = dict(sim=sim, np=np, debug_nojit=False)
-    kernel = NbBackend().build_py_func(template, content, print_source=True, name='run_sim')
+    kernel = _get_mako_kernel()
     benchmark(lambda : kernel(sim))
 
 
 def test_nb_mako_100ms(benchmark):
     sim = make_sim(100.0)
-    template = '<%include file="nb-sim.py.mako"/>'
-    content = dict(sim=sim, np=np, debug_nojit=False)
-    kernel = NbBackend().build_py_func(template, content, print_source=True, name='run_sim')
+    kernel = _get_mako_kernel()
     benchmark(lambda : kernel(sim))
 
 def test_nb_mako_1000ms(benchmark):
     sim = make_sim(1000.0)
-    template = '<%include file="nb-sim.py.mako"/>'
-    content = dict(sim=sim, np=np, debug_nojit=False)
-    kernel = NbBackend().build_py_func(template, content, print_source=True, name='run_sim')
+    kernel = _get_mako_kernel()
     benchmark(lambda : kernel(sim))
 
 def run_sim_pdq(sim, integrate):
@@ -109,33 +184,59 @@ def run_sim_pdq(sim, integrate):
 
 def test_nb_pdq_10ms(benchmark):
     sim = make_sim(10.0)
-    template = '<%include file="nb-montbrio.py.mako"/>'
-    content = dict(
-            compatibility_mode=False, 
-            sim=sim
-    ) 
-    integrate = NbMPRBackend().build_py_func(template, content, name='integrate', print_source=True)
-
+    integrate = _get_pdq_kernel()
     benchmark(lambda : run_sim_pdq(sim, integrate))
 
 def test_nb_pdq_100ms(benchmark):
     sim = make_sim(100.0)
-    template = '<%include file="nb-montbrio.py.mako"/>'
-    content = dict(
-            compatibility_mode=False, 
-            sim=sim
-    ) 
-    integrate = NbMPRBackend().build_py_func(template, content, name='integrate', print_source=True)
-
+    integrate = _get_pdq_kernel()
     benchmark(lambda : run_sim_pdq(sim, integrate))
 
 def test_nb_pdq_1000ms(benchmark):
     sim = make_sim(1000.0)
-    template = '<%include file="nb-montbrio.py.mako"/>'
-    content = dict(
-            compatibility_mode=False, 
-            sim=sim
-    ) 
-    integrate = NbMPRBackend().build_py_func(template, content, name='integrate', print_source=True)
-
+    integrate = _get_pdq_kernel()
     benchmark(lambda : run_sim_pdq(sim, integrate))
+
+def run_sim_pdq_cuda(sim, integrate, n_batch=32):
+    nstep = int(np.ceil(sim.simulation_length/sim.integrator.dt))
+    horizon = sim.connectivity.horizon
+    buf_len = horizon + nstep
+    N = sim.connectivity.number_of_regions
+    gf = np.reshape(sim.integrator.noise.gfun(None), (-1, 1, 1, 1))
+
+    # one independent trajectory per block, one node per thread
+    r, V = sim.integrator.noise.generate( shape=(2,n_batch,N,buf_len) ) * gf
+    r[...,:horizon] = np.roll(sim.history.buffer[:,0,:,0], -1, axis=0).T
+    V[...,:horizon] = np.roll(sim.history.buffer[:,1,:,0], -1, axis=0).T
+    parmat = sim.model.spatial_parameter_matrix.T
+    if parmat.size == 0:
+        parmat = np.zeros((N, 1))
+    parmat = np.ascontiguousarray(np.broadcast_to(parmat, (n_batch,) + parmat.shape))
+
+    r, V = cuda.to_device(r), cuda.to_device(V)
+    integrate[(n_batch,), (N,)](
+        N,
+        sim.integrator.dt,
+        nstep,
+        horizon,
+        r,
+        V,
+        cuda.to_device(sim.connectivity.weights),
+        cuda.to_device(sim.connectivity.idelays),
+        cuda.to_device(parmat),
+        None
+    )
+    cuda.synchronize()
+    return r.copy_to_host()[...,horizon:], V.copy_to_host()[...,horizon:]
+
+@pytest.mark.skipif(not cuda.is_available(), reason='requires Numba CUDA')
+def test_nb_pdq_cuda_10ms(benchmark):
+    sim = make_sim(10.0)
+    integrate = _get_pdq_cuda_kernel()
+    benchmark(lambda : run_sim_pdq_cuda(sim, integrate))
+
+@pytest.mark.skipif(not cuda.is_available(), reason='requires Numba CUDA')
+def test_nb_pdq_cuda_100ms(benchmark):
+    sim = make_sim(100.0)
+    integrate = _get_pdq_cuda_kernel()
+    benchmark(lambda : run_sim_pdq_cuda(sim, integrate))
@@ -44,10 +44,9 @@ from tvb.simulator.integrators import (EulerDeterministic, EulerStochastic,
     RungeKutta4thOrderDeterministic, Identity, IdentityStochastic,
     VODEStochastic)
 from tvb.simulator.noise import Additive, Multiplicative
-from tvb.datatypes.connectivity import Connectivity
 
 from .backendtestbase import (BaseTestSim, BaseTestCoupling, BaseTestDfun,
-    BaseTestIntegrate)
+    BaseTestIntegrate, default_connectivity)
 
 
 class TestNpSim(BaseTestSim):
@@ -66,9 +65,9 @@ class TestNpSim(BaseTestSim):
         if not delays:
             self.assertEqual(sim.connectivity.horizon, 1)  # for now
         state = state.reshape((n_svar, sim.connectivity.horizon, n_node))
-        weights = sim.connectivity.weights.copy()
-        yh = np.empty((len(t),)+state[:,0].shape)
-        parmat = sim.model.spatial_parameter_matrix
+        weights = sim.connectivity.weights.astype(np.float32)
+        yh = np.empty((len(t),)+state[:,0].shape, dtype=np.float32)
+        parmat = sim.model.spatial_parameter_matrix.astype(np.float32)
         self.assertEqual(parmat.shape[0], 1)
         self.assertEqual(parmat.shape[1], weights.shape[1])
         np.random.seed(42)
@@ -206,7 +205,7 @@ class TestNpIntegrate(BaseTestIntegrate):
     def _eval_cg(self, integrator_, state, weights_):
         class sim:
             integrator = integrator_
-            connectivity = Connectivity.from_file()
+            connectivity = default_connectivity()
             class model:
                 state_variables = 'foo', 'bar'
         sim.connectivity.speed = np.r_[np.inf]